@@ -9,8 +9,11 @@ import fnmatch
 import glob
 import logging
 import os
+import pickle
 import shutil
 import sys
+import tempfile
+import threading
 
 from pylib import android_commands
 from pylib import cmd_helper
@@ -90,6 +93,9 @@ _DEPS_EXCLUSION_LIST = [
 _ISOLATE_SCRIPT = os.path.join(
     constants.DIR_SOURCE_ROOT, 'tools', 'swarming_client', 'isolate.py')
 
+# Name of the file in the out directory caching test lists read from devices.
+_TEST_LIST_CACHE_FILE = '.gtest_test_list_cache'
+
 
 def _GenerateDepsDirUsingIsolate(suite_name):
   """Generate the dependency dir for the test suite using isolate.
@@ -206,6 +212,11 @@ def _GetDisabledTestsFilterFromFile(suite_name):
 def _GetTestsFromDevice(runner_factory, devices):
   """Get a list of tests from a device.
 
+  All devices are queried in parallel, so unresponsive devices cost one timeout
+  in total rather than one each. Every query is waited on before returning,
+  since each one installs the package and no device may still be doing so
+  when its shard starts.
+
   Args:
     runner_factory: Callable that takes device and shard_index and returns
         a TestRunner.
@@ -214,17 +225,96 @@ def _GetTestsFromDevice(runner_factory, devices):
   Returns:
     All the tests in the test suite.
   """
-  for device in devices:
+  results = {}
+
+  def _GetTests(device):
     try:
       logging.info('Obtaining tests from %s', device)
-      return runner_factory(device, 0).GetAllTests()
+      results[device] = (runner_factory(device, 0).GetAllTests(), None)
     except (android_commands.errors.WaitForResponseTimedOutError,
             android_commands.errors.DeviceUnresponsiveError), e:
       logging.warning('Failed obtaining test list from %s with exception: %s',
                       device, e)
+    except Exception:  # pylint: disable=W0703
+      results[device] = (None, sys.exc_info())
+
+  threads = [threading.Thread(target=_GetTests, args=(d,)) for d in devices]
+  for t in threads:
+    t.start()
+  for t in threads:
+    # Join with a timeout so Ctrl-C is still delivered under Python 2.
+    while t.is_alive():
+      t.join(1)
+
+  for device in devices:
+    if device in results:
+      tests, exc_info = results[device]
+      if exc_info:
+        raise exc_info[0], exc_info[1], exc_info[2]
+      return tests
   raise Exception('Failed to obtain test list from devices.')
 
 
+def _GetTestsUsingCache(runner_factory, devices, suite_path):
+  """Get a list of tests, reusing a previous listing of the same binary.
+
+  Obtaining the list requires installing the test package on a device, so the
+  result is cached in the out directory keyed on the path and modification time
+  of |suite_path|. A rebuilt suite invalidates its entry.
+
+  Args:
+    runner_factory: Callable that takes device and shard_index and returns
+        a TestRunner.
+    devices: A list of device ids.
+    suite_path: Path to the test package on the host.
+
+  Returns:
+    All the tests in the test suite.
+  """
+  cache_path = os.path.join(constants.GetOutDirectory(), _TEST_LIST_CACHE_FILE)
+  key = (os.path.abspath(suite_path), os.path.getmtime(suite_path))
+
+  cache = {}
+  if os.path.exists(cache_path):
+    try:
+      with open(cache_path, 'rb') as f:
+        cache = pickle.load(f)
+      if not isinstance(cache, dict):
+        raise TypeError('expected a dict, got %s' % type(cache).__name__)
+    except Exception, e:  # pylint: disable=W0703
+      logging.warning('Ignoring unreadable test list cache %s: %s',
+                      cache_path, e)
+      cache = {}
+  if key in cache:
+    logging.info('Using cached test list for %s', suite_path)
+    return cache[key]
+
+  tests = _GetTestsFromDevice(runner_factory, devices)
+  # An empty list most likely means the listing failed; caching it would skip
+  # the suite until it is rebuilt.
+  if not tests:
+    return tests
+
+  # Drop entries for older builds of this suite before storing the new one.
+  cache = dict((k, v) for k, v in cache.iteritems() if k[0] != key[0])
+  cache[key] = tests
+  # Write to a temporary file and rename it into place so that concurrent runs
+  # never read a partially written cache.
+  try:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path),
+                                    prefix=_TEST_LIST_CACHE_FILE)
+    try:
+      with os.fdopen(fd, 'wb') as f:
+        pickle.dump(cache, f, pickle.HIGHEST_PROTOCOL)
+      os.rename(tmp_path, cache_path)
+    except Exception:  # pylint: disable=W0703
+      os.remove(tmp_path)
+      raise
+  except Exception, e:  # pylint: disable=W0703
+    logging.warning('Failed to write test list cache %s: %s', cache_path, e)
+  return tests
+
+
 def _FilterTestsUsingPrefixes(all_tests, pre=False, manual=False):
   """Removes tests with disabled prefixes.
 
@@ -245,10 +335,12 @@ def _FilterTestsUsingPrefixes(all_tests, pre=False, manual=False):
   if not manual:
     filter_prefixes.append('MANUAL_')
 
+  # str.startswith() accepts a tuple, matching all prefixes in a single call.
+  filter_prefixes = tuple(filter_prefixes)
   for t in all_tests:
     test_case, test = t.split('.', 1)
-    if not any([test_case.startswith(prefix) or test.startswith(prefix) for
-                prefix in filter_prefixes]):
+    if not (test_case.startswith(filter_prefixes) or
+            test.startswith(filter_prefixes)):
       filtered_tests.append(t)
   return filtered_tests
 
@@ -286,6 +378,11 @@ def Setup(test_options, devices):
   Returns:
     A tuple of (TestRunnerFactory, tests).
   """
+  # Bail out before the (slow) isolate remap if there is nothing to run on.
+  if not devices:
+    raise Exception('No attached devices to run %s on.'
+                    % test_options.suite_name)
+
   test_package = test_package_apk.TestPackageApk(test_options.suite_name)
   if not os.path.exists(test_package.suite_path):
     test_package = test_package_exe.TestPackageExecutable(
@@ -305,7 +402,8 @@ def Setup(test_options, devices):
         device,
         test_package)
 
-  tests = _GetTestsFromDevice(TestRunnerFactory, devices)
+  tests = _GetTestsUsingCache(TestRunnerFactory, devices,
+                              test_package.suite_path)
   if test_options.run_disabled:
     test_options = test_options._replace(
         test_arguments=('%s --gtest_also_run_disabled_tests' %
@@ -9,15 +9,126 @@ This module works much like the cp posix command - it takes 2 arguments:
 (src, dst) and copies the file with path |src| to |dst|.
 """
 
+import errno
+import logging
 import os
 import shutil
 import sys
 
 
+# FICLONE ioctl request, _IOW(0x94, 9, int) from linux/fs.h.
+_FICLONE = 0x40049409
+
+# Errors meaning the filesystem or kernel can't do a fast copy, so the copy
+# should fall back to the next method.
+_UNSUPPORTED_ERRNOS = (errno.EINVAL, errno.ENOSYS, errno.ENOTTY,
+                       errno.EOPNOTSUPP, errno.EXDEV)
+
+
+def _CopyFileContents(src, dst):
+  """Copies the data of |src| to |dst|, avoiding userspace buffers if possible.
+
+  On Linux this first tries a copy-on-write clone (btrfs, xfs with reflink),
+  then an in-kernel os.sendfile() where available, and finally a plain
+  buffered copy.
+  """
+  if not sys.platform.startswith('linux'):
+    logging.debug('Copying %s to %s with shutil.copyfile', src, dst)
+    shutil.copyfile(src, dst)
+    return
+
+  import fcntl
+  with open(src, 'rb') as fsrc:
+    with open(dst, 'wb') as fdst:
+      try:
+        fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        logging.debug('Cloned %s to %s with FICLONE', src, dst)
+        return
+      except IOError as e:
+        if e.errno not in _UNSUPPORTED_ERRNOS:
+          raise
+
+      sendfile = getattr(os, 'sendfile', None)
+      if sendfile:
+        size = os.fstat(fsrc.fileno()).st_size
+        offset = 0
+        try:
+          while offset < size:
+            sent = sendfile(fdst.fileno(), fsrc.fileno(), offset,
+                            min(size - offset, 2 ** 30))
+            if not sent:
+              break
+            offset += sent
+          logging.debug('Copied %s to %s with sendfile', src, dst)
+          return
+        except OSError as e:
+          # Older kernels only support sendfile() to sockets.
+          if offset or e.errno not in _UNSUPPORTED_ERRNOS:
+            raise
+
+      logging.debug('Copying %s to %s with a buffered copy', src, dst)
+      shutil.copyfileobj(fsrc, fdst)
+
+
+def _TryLink(src, dst):
+  """Hardlinks |dst| to |src|, returning False if the link can't be made."""
+  # Python 2 on Windows has no os.link().
+  link = getattr(os, 'link', None)
+  if not link:
+    return False
+  try:
+    link(src, dst)
+    logging.debug('Hardlinked %s to %s', dst, src)
+    return True
+  except OSError as e:
+    if e.errno in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+      return False
+    raise
+
+
+def _SameFile(src, dst):
+  """Returns True if |src| and |dst| refer to the same file."""
+  # Python 2's ntpath has no samefile(); compare normalized paths instead.
+  if hasattr(os.path, 'samefile'):
+    try:
+      return os.path.samefile(src, dst)
+    except OSError:
+      return False
+  return (os.path.normcase(os.path.abspath(src)) ==
+          os.path.normcase(os.path.abspath(dst)))
+
+
 def Main(src, dst):
-  # Use copy instead of copyfile to ensure the executable bit is copied.
-  return shutil.copy(src, os.path.normpath(dst))
+  # Hardlinking is only safe when nothing modifies the copy in place, so the
+  # build has to opt in.
+  link_ok = os.environ.get('GN_COPY_LINK_OK') == '1'
+
+  dst = os.path.normpath(dst)
+  if os.path.isdir(dst):
+    dst = os.path.join(dst, os.path.basename(src))
+  if os.path.exists(dst):
+    if _SameFile(src, dst):
+      # Opening |dst| for writing would truncate |src| if they are the same
+      # path. A hardlink from an earlier run is either kept or replaced.
+      if os.path.realpath(src) == os.path.realpath(dst):
+        raise shutil.Error('`%s` and `%s` are the same file' % (src, dst))
+      if link_ok:
+        logging.debug('%s is already a hardlink of %s', dst, src)
+        return
+      os.remove(dst)
+    elif link_ok:
+      os.remove(dst)
+
+  if link_ok and _TryLink(src, dst):
+    return
+  _CopyFileContents(src, dst)
+  # Copy the mode too, to ensure the executable bit is copied.
+  shutil.copymode(src, dst)
 
 
 if __name__ == '__main__':
+  # cp.py runs once per copy action, so which copy method was used is only
+  # reported on request.
+  if os.environ.get('GN_COPY_DEBUG') == '1':
+    logging.basicConfig(level=logging.DEBUG)
   sys.exit(Main(sys.argv[1], sys.argv[2]))